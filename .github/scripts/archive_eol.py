@@ -1,14 +1,187 @@
+import collections
+import concurrent.futures
 import datetime
+import hashlib
+import itertools
+import json
 import os
 import subprocess
+import threading
 import time
+import urllib.parse
 
-import github
-from github.GithubException import (
-    RateLimitExceededException,
-    UnknownObjectException,
-    GithubException,
+import requests
+
+API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+CACHE_PATH = os.environ.get(
+    "ARCHIVE_CACHE",
+    os.path.join(os.path.expanduser("~/.cache/flathub-archive"), "eol-api.json"),
+)
+REFS_CACHE_PATH = os.environ.get(
+    "EOL_REFS_CACHE",
+    os.path.join(os.path.expanduser("~/.cache/flathub-archive"), "eol-refs.json"),
 )
+FLATPAK = os.environ.get("FLATPAK", "flatpak")
+REMOTES = ("flathub", "flathub-beta")
+ARCHES = ("x86_64", "aarch64")
+SUMMARY_PATH = os.environ.get("ARCHIVE_SUMMARY", "archive_eol_summary.json")
+WORKERS = int(os.environ.get("ARCHIVE_WORKERS", "8"))
+# Requests per second shared by all workers, and the burst allowed on top
+RATE = float(os.environ.get("ARCHIVE_RATE", "10"))
+BURST = int(os.environ.get("ARCHIVE_BURST", "20"))
+
+ARCHIVE_DESC = "This repo is archived by Flathub as the app is EOL. If this was done in error, please open an issue at https://github.com/flathub/flathub/issues"
+
+
+class TokenBucket:
+    """Rate limiter shared by all workers.
+
+    Hands out `rate` tokens per second with bursts up to `capacity`.
+    pause_until() stalls every worker until the API rate limit resets.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    wait = self.resume_at - now
+                else:
+                    elapsed = now - self.updated
+                    self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause_until(self, epoch: float) -> None:
+        with self.lock:
+            resume_at = time.monotonic() + max(0.0, epoch - time.time())
+            self.resume_at = max(self.resume_at, resume_at)
+
+
+class ResponseCache:
+    """On-disk ETag/Last-Modified cache of GET responses, keyed by URL."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, url: str):
+        with self.lock:
+            return self.entries.get(url)
+
+    def put(self, url: str, etag, last_modified, body) -> None:
+        if not etag and not last_modified:
+            return
+        with self.lock:
+            self.entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "body": body,
+            }
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.lock:
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f)
+
+
+class GitHubClient:
+    """Minimal thread-safe REST client using conditional requests.
+
+    A 304 answer to a conditional request does not count against the
+    rate limit, so unchanged repos are nearly free on later runs.
+    """
+
+    def __init__(
+        self, token: str, api_url: str, bucket: TokenBucket, cache: ResponseCache
+    ) -> None:
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.bucket = bucket
+        self.cache = cache
+        self.stats: collections.Counter = collections.Counter()
+        self.rate_limit_remaining = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get(self, path: str):
+        """Return the decoded JSON body, or None if the object does not exist."""
+        url = self.api_url + path
+        cached = self.cache.get(url)
+        headers = {}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        resp = self._request("GET", url, headers=headers)
+        if resp.status_code == 304 and cached:
+            self._count("not_modified")
+            return cached["body"]
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        body = resp.json()
+        self.cache.put(
+            url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), body
+        )
+        return body
+
+    def patch(self, path: str, data: dict) -> None:
+        resp = self._request("PATCH", self.api_url + path, json=data)
+        resp.raise_for_status()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {self.token}"
+            session.headers["Accept"] = "application/vnd.github+json"
+            self.local.session = session
+        return session
+
+    def _count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        while True:
+            self.bucket.acquire()
+            self._count(method)
+            resp = self._session().request(method, url, timeout=60, **kwargs)
+            remaining = resp.headers.get("X-RateLimit-Remaining")
+            if remaining is not None:
+                self.rate_limit_remaining = int(remaining)
+            if resp.status_code not in (403, 429):
+                return resp
+            if "Retry-After" in resp.headers:
+                reset = time.time() + int(resp.headers["Retry-After"])
+            elif remaining == "0":
+                reset = float(resp.headers.get("X-RateLimit-Reset", time.time() + 60))
+            else:
+                return resp
+            print("Rate limited")
+            self._count("rate_limited")
+            self.bucket.pause_until(reset + 10)
 
 
 def ignore_ref(ref: str) -> bool:
@@ -24,34 +197,166 @@ def ignore_ref(ref: str) -> bool:
     return False
 
 
+def parse_remote_ls_line(line: str):
+    """Return the ref name if a `remote-ls --columns=ref,options` line is EOL."""
+    ref, _, options = line.rstrip("\n").partition("\t")
+    if not ref or ignore_ref(ref):
+        return None
+    if any(x in options for x in ("eol=", "eol-rebase=")):
+        return ref.split("/")[1]
+    return None
+
+
+def get_remote_urls() -> dict:
+    cmd = [FLATPAK, "remotes", "--user", "--columns=name,url"]
+    ret = subprocess.run(cmd, capture_output=True, encoding="utf-8")
+    urls = {}
+    if ret.returncode == 0:
+        for line in ret.stdout.splitlines():
+            name, _, url = line.partition("\t")
+            if name and url:
+                urls[name] = url.strip()
+    return urls
+
+
+def summary_checksum(url: str):
+    """Checksum of the remote's summary index, or None if unavailable.
+
+    The index changes whenever any ref in the remote changes, so it is a
+    cheap key for a cached listing.
+    """
+    for name in ("summary.idx", "summary"):
+        try:
+            resp = requests.get(f"{url.rstrip('/')}/{name}", timeout=30)
+        except requests.RequestException:
+            return None
+        if resp.status_code == 200:
+            return hashlib.sha256(resp.content).hexdigest()
+    return None
+
+
 def get_eol_refs(arch: str, remote: str) -> set:
-    cmd = (
-        f'flatpak remote-ls --user --arch="{arch}" --all --columns=ref,options {remote}'
-    )
-    ret = subprocess.run(cmd, shell=True, capture_output=True, encoding="utf-8")
+    cmd = [
+        FLATPAK,
+        "remote-ls",
+        "--user",
+        f"--arch={arch}",
+        "--all",
+        "--columns=ref,options",
+        remote,
+    ]
     eol_refs: set = set()
 
-    if ret.returncode == 0 and ret.stdout:
-        for line in ret.stdout.split("\n"):
-            if line:
-                split = line.split("\t")
-            if len(split) < 2:
-                continue
-            ref, options = split
-            if ignore_ref(ref):
-                continue
-            refname = ref.split("/")[1]
-            if any(x in options for x in ("eol=", "eol-rebase=")):
+    # Parse as the listing streams in rather than buffering all of it
+    with subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding="utf-8"
+    ) as proc:
+        for line in proc.stdout:
+            refname = parse_remote_ls_line(line)
+            if refname:
                 eol_refs.add(refname)
 
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
     return eol_refs
 
 
+def collect_eol_refs(remotes=REMOTES, arches=ARCHES) -> set:
+    """EOL ref names across all remote/arch pairs, listed in parallel.
+
+    Listings are cached per remote/arch in REFS_CACHE_PATH and reused while
+    the remote's summary checksum is unchanged.
+    """
+    try:
+        with open(REFS_CACHE_PATH) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    urls = get_remote_urls()
+    pairs = list(itertools.product(remotes, arches))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(pairs)) as pool:
+
+        def checksum(remote: str):
+            url = urls.get(remote)
+            return summary_checksum(url) if url else None
+
+        checksums = dict(zip(remotes, pool.map(checksum, remotes)))
+
+        futures = {}
+        eol_refs: set = set()
+        for remote, arch in pairs:
+            cached = cache.get(f"{remote}/{arch}")
+            if checksums[remote] and cached and cached["checksum"] == checksums[remote]:
+                eol_refs.update(cached["refs"])
+            else:
+                futures[pool.submit(get_eol_refs, arch, remote)] = (remote, arch)
+
+        for future in concurrent.futures.as_completed(futures):
+            remote, arch = futures[future]
+            try:
+                refs = future.result()
+            except subprocess.CalledProcessError:
+                print(f"flatpak remote-ls failed for {remote}/{arch}")
+                continue
+            eol_refs |= refs
+            if checksums[remote]:
+                cache[f"{remote}/{arch}"] = {
+                    "checksum": checksums[remote],
+                    "refs": sorted(refs),
+                }
+
+    os.makedirs(os.path.dirname(REFS_CACHE_PATH) or ".", exist_ok=True)
+    with open(REFS_CACHE_PATH, "w") as f:
+        json.dump(cache, f)
+    return eol_refs
+
+
+def parse_date(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(
+        datetime.timezone.utc
+    )
+
+
+def check_repo(client: GitHubClient, refname: str, earliest: datetime.datetime):
+    """Archive flathub/<refname> if its last commit is older than earliest.
+
+    Returns the repo URL if it was archived, None otherwise.
+    """
+    path = f"/repos/flathub/{refname}"
+    repo = client.get(path)
+    if repo is None or repo["archived"]:
+        return None
+
+    # The branch object already carries the head commit and its date, so
+    # a separate commit lookup is not needed.
+    branch_name = urllib.parse.quote(repo["default_branch"], safe="")
+    try:
+        branch = client.get(f"{path}/branches/{branch_name}")
+    except requests.HTTPError:
+        branch = None
+    if branch is None:
+        return None
+    last_commit_time = parse_date(branch["commit"]["commit"]["committer"]["date"])
+
+    if last_commit_time >= earliest:
+        return None
+
+    print(
+        "Archiving: {} Repo is in EOL list. Last push: {}, earlier than: {}".format(
+            repo["html_url"],
+            last_commit_time.isoformat(),
+            earliest.isoformat(),
+        )
+    )
+    client.patch(path, {"description": ARCHIVE_DESC})
+    client.patch(path, {"archived": True})
+    return repo["html_url"]
+
+
 def main() -> None:
     token = os.environ["GITHUB_TOKEN"]
 
-    g = github.Github(auth=github.Auth.Token(token))
-
     # Exclude refs that have EOL notices but are still maintained
     # in some branch
     excludes = {
@@ -134,11 +439,11 @@ def main() -> None:
         "org.videolan.VLC.Plugin.makemkv",
     }
 
-    stable = get_eol_refs("x86_64", "flathub") | get_eol_refs("aarch64", "flathub")
-    beta = get_eol_refs("x86_64", "flathub-beta") | get_eol_refs(
-        "aarch64", "flathub-beta"
-    )
-    eols = list({x.lower() for x in (stable | beta)} - {x.lower() for x in excludes})
+    timings = {}
+    start = time.monotonic()
+    refs = collect_eol_refs()
+    eols = sorted({x.lower() for x in refs} - {x.lower() for x in excludes})
+    timings["remote_ls"] = time.monotonic() - start
 
     if not eols:
         return
@@ -146,42 +451,45 @@ def main() -> None:
     earliest = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
         weeks=13
     )
-    count = 0
-    while count < len(eols):
-        refname = eols[count]
-        try:
-            repo = g.get_repo(f"flathub/{refname}")
-            if not repo.archived:
-                try:
-                    default_branch = repo.default_branch
-                    branch = repo.get_branch(default_branch)
-                    last_commit = repo.get_commit(branch.commit.sha)
-                    last_commit_time = last_commit.commit.committer.date.astimezone(
-                        datetime.timezone.utc
-                    )
-                except GithubException:
-                    last_commit_time = datetime.datetime.now(
-                        datetime.timezone.utc
-                    ) + datetime.timedelta(seconds=10)
-                    pass
-                if last_commit_time < earliest:
-                    print(
-                        "Archiving: {} Repo is in EOL list. Last push: {}, earlier than: {}".format(
-                            repo.html_url,
-                            last_commit_time.isoformat(),
-                            earliest.isoformat(),
-                        )
-                    )
-                    desc = "This repo is archived by Flathub as the app is EOL. If this was done in error, please open an issue at https://github.com/flathub/flathub/issues"
-                    repo.edit(description=desc)
-                    repo.edit(archived=True)
-        except UnknownObjectException:
-            pass
-        except RateLimitExceededException:
-            print("Rate limited")
-            time.sleep(g.rate_limiting_resettime - time.time() + 10)
-            continue
-        count += 1
+
+    cache = ResponseCache(CACHE_PATH)
+    client = GitHubClient(token, API_URL, TokenBucket(RATE, BURST), cache)
+    archived = []
+    errors = {}
+
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        futures = {
+            pool.submit(check_repo, client, refname, earliest): refname
+            for refname in eols
+        }
+        for future in concurrent.futures.as_completed(futures):
+            refname = futures[future]
+            # One bad repo (HTTP error, unexpected body) must not lose the
+            # cache and summary of the whole run
+            try:
+                url = future.result()
+            except Exception as err:
+                errors[refname] = f"{type(err).__name__}: {err}"
+                continue
+            if url:
+                archived.append(url)
+    timings["scan"] = time.monotonic() - start
+
+    cache.save()
+
+    summary = {
+        "repos_checked": len(eols),
+        "archived": sorted(archived),
+        "errors": errors,
+        "api_calls": dict(client.stats),
+        "rate_limit_remaining": client.rate_limit_remaining,
+        "timings_seconds": {k: round(v, 3) for k, v in timings.items()},
+        "workers": WORKERS,
+    }
+    with open(SUMMARY_PATH, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary["api_calls"]), json.dumps(summary["timings_seconds"]))
 
 
 if __name__ == "__main__":
@@ -1,19 +1,186 @@
 import datetime
+import json
 import os
 import time
 
-import github
-from github.GithubException import (
-    RateLimitExceededException,
-    GithubException,
+import requests
+
+GRAPHQL_URL = os.environ.get("GITHUB_GRAPHQL_URL", "https://api.github.com/graphql")
+CACHE_DIR = os.path.expanduser("~/.cache/flathub-archive")
+# Everything known about each repo, plus the time of the last complete scan
+STATE_PATH = os.environ.get("ORPHAN_STATE", os.path.join(CACHE_DIR, "orphan.json"))
+# Cursor of an interrupted scan; the next run resumes from it
+CHECKPOINT_PATH = os.environ.get(
+    "ORPHAN_CHECKPOINT", os.path.join(CACHE_DIR, "orphan-checkpoint.json")
 )
+# Only recheck repos pushed since the last complete scan
+INCREMENTAL = os.environ.get("ORPHAN_INCREMENTAL") == "1"
+
+ORG = "flathub"
+PAGE_SIZE = 100
+# Retries per request for rate limits and server errors
+MAX_RETRIES = 5
+
+# Full scans page by creation date, which doesn't shift while paging.
+# Incremental scans page by push date, newest first, and stop at the last run.
+QUERY = """
+query($org: String!, $first: Int!, $cursor: String,
+      $order: RepositoryOrderField!) {
+  rateLimit { cost remaining resetAt }
+  organization(login: $org) {
+    repositories(first: $first, after: $cursor,
+                 orderBy: {field: $order, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        url
+        isArchived
+        pushedAt
+        defaultBranchRef { target { ... on Commit { committedDate } } }
+        collaborators(affiliation: DIRECT) { totalCount }
+      }
+    }
+  }
+}
+"""
+
+
+def parse_date(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(
+        datetime.timezone.utc
+    )
+
+
+def load_json(path: str, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path: str, data) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def retry_delay(resp: requests.Response) -> float | None:
+    """Seconds to wait before retrying resp, or None if it is not retryable."""
+    if "Retry-After" in resp.headers:
+        return int(resp.headers["Retry-After"])
+    if resp.status_code == 403:
+        # Any other 403 is a real permission error
+        if resp.headers.get("X-RateLimit-Remaining") != "0":
+            return None
+        reset = float(resp.headers.get("X-RateLimit-Reset", time.time() + 60))
+        return max(0.0, reset - time.time()) + 10
+    if resp.status_code == 429 or resp.status_code >= 500:
+        return 60
+    return None
+
+
+def graphql(session: requests.Session, variables: dict) -> dict:
+    for attempt in range(MAX_RETRIES + 1):
+        resp = session.post(
+            GRAPHQL_URL, json={"query": QUERY, "variables": variables}, timeout=120
+        )
+        wait = retry_delay(resp) if resp.status_code >= 400 else None
+        if wait is not None and attempt < MAX_RETRIES:
+            print(f"Rate limited or server error ({resp.status_code})")
+            time.sleep(wait)
+            continue
+        resp.raise_for_status()
+        body = resp.json()
+
+        # Per-field errors (e.g. no access to one repo's collaborators) still
+        # come with data; only a missing payload is fatal.
+        errors = body.get("errors") or []
+        if any(e.get("type") == "RATE_LIMITED" for e in errors):
+            if attempt < MAX_RETRIES:
+                print("Rate limited")
+                time.sleep(60)
+                continue
+        if not body.get("data"):
+            raise RuntimeError(f"GraphQL query failed: {errors}")
+
+        rate = body["data"].get("rateLimit")
+        if rate and rate["remaining"] < 2 * rate["cost"]:
+            reset = parse_date(rate["resetAt"]).timestamp()
+            print("Rate limited")
+            time.sleep(max(0.0, reset - time.time()) + 10)
+        return body["data"]
+
+
+def repo_record(node: dict) -> dict:
+    target = (node.get("defaultBranchRef") or {}).get("target") or {}
+    collaborators = node.get("collaborators")
+    return {
+        "url": node["url"],
+        "archived": node["isArchived"],
+        "pushed": node["pushedAt"],
+        "committed": target.get("committedDate"),
+        # Unknown (no access) counts as maintained, like a failed lookup did
+        "collaborators": collaborators["totalCount"] if collaborators else 1,
+    }
+
+
+def scan(session: requests.Session, state: dict) -> None:
+    """Fetch repo pages into state["repos"], checkpointing after each page."""
+    checkpoint = load_json(CHECKPOINT_PATH, None)
+    if checkpoint:
+        print(f"Resuming {checkpoint['mode']} scan from checkpoint")
+    else:
+        since = state.get("last_run") if INCREMENTAL else None
+        checkpoint = {
+            "mode": "incremental" if since else "full",
+            "since": since,
+            "started": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "cursor": None,
+        }
+        if not since:
+            # A full scan rebuilds the list, dropping repos gone from the org
+            state["repos"] = {}
+
+    since = parse_date(checkpoint["since"]) if checkpoint["since"] else None
+    order = "PUSHED_AT" if since else "CREATED_AT"
+    repos = state.setdefault("repos", {})
+
+    while True:
+        data = graphql(
+            session,
+            {
+                "org": ORG,
+                "first": PAGE_SIZE,
+                "cursor": checkpoint["cursor"],
+                "order": order,
+            },
+        )
+        page = data["organization"]["repositories"]
+        reached_since = False
+        for node in page["nodes"]:
+            if since and node["pushedAt"] and parse_date(node["pushedAt"]) < since:
+                reached_since = True
+                break
+            repos[node["name"]] = repo_record(node)
+
+        checkpoint["cursor"] = page["pageInfo"]["endCursor"]
+        save_json(STATE_PATH, state)
+        save_json(CHECKPOINT_PATH, checkpoint)
+        if reached_since or not page["pageInfo"]["hasNextPage"]:
+            break
+
+    state["last_run"] = checkpoint["started"]
+    save_json(STATE_PATH, state)
+    os.remove(CHECKPOINT_PATH)
 
 
 def main() -> None:
     token = os.environ["GITHUB_TOKEN"]
-    g = github.Github(auth=github.Auth.Token(token))
-
-    org = g.get_organization("flathub")
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
 
     #    excludes = {}
 
@@ -21,37 +188,24 @@ def main() -> None:
         weeks=60
     )
 
-    for repo in org.get_repos():
-        if not repo.archived:
-            try:
-                default_branch = repo.default_branch
-                branch = repo.get_branch(default_branch)
-                last_commit = repo.get_commit(branch.commit.sha)
-                last_commit_time = last_commit.commit.committer.date.astimezone(
-                    datetime.timezone.utc
-                )
-                collaborators = repo.get_collaborators(affiliation="direct")
-                colb_count = collaborators.totalCount
-            except GithubException:
-                last_commit_time = datetime.datetime.now(
-                    datetime.timezone.utc
-                ) + datetime.timedelta(seconds=10)
-                colb_count = 1
-                pass
-            except RateLimitExceededException:
-                print("Rate limited")
-                time.sleep(g.rate_limiting_resettime - time.time() + 10)
-                continue
+    state = load_json(STATE_PATH, {})
+    scan(session, state)
 
-            if colb_count == 0 and last_commit_time < earliest:
-                print(
-                    "Archiving: {} Repo has no collaborators. Last push: {}, earlier than: {}".format(
-                        repo.html_url,
-                        last_commit_time.isoformat(),
-                        earliest.isoformat(),
-                    )
+    # Repos not pushed since the last run keep their stored data but are
+    # re-evaluated, since they may have crossed the age threshold meanwhile.
+    for repo in state["repos"].values():
+        if repo["archived"] or not repo["committed"]:
+            continue
+        last_commit_time = parse_date(repo["committed"])
+        if repo["collaborators"] == 0 and last_commit_time < earliest:
+            print(
+                "Archiving: {} Repo has no collaborators. Last push: {}, earlier than: {}".format(
+                    repo["url"],
+                    last_commit_time.isoformat(),
+                    earliest.isoformat(),
                 )
-                # desc = "This repo is archived by Flathub as it is orphaned. If this was done in error or you wish to maintain it, please open an issue at https://github.com/flathub/flathub/issues"
+            )
+            # desc = "This repo is archived by Flathub as it is orphaned. If this was done in error or you wish to maintain it, please open an issue at https://github.com/flathub/flathub/issues"
 
 
 #                repo.edit(description=desc)
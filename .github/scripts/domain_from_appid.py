@@ -1,7 +1,15 @@
 # ONLY handle appids that need to use `org.flathub.VerifiedApps.txt`
 
-import sys
+import argparse
+import functools
+import importlib.metadata
+import json
+import os
+import pickle
 import re
+import sys
+import time
+
 from publicsuffixlist import PublicSuffixList
 
 LOGINS = (
@@ -16,6 +24,42 @@ LOGINS = (
     "org.gnome.",
 )
 
+RUNTIMES = (
+    "org.freedesktop.Platform.",
+    "org.freedesktop.Sdk.",
+    "org.gnome.Platform.",
+    "org.gnome.Sdk.",
+    "org.gtk.Gtk3theme.",
+    "org.kde.KStyle.",
+    "org.kde.Platform.",
+    "org.kde.PlatformInputContexts.",
+    "org.kde.PlatformTheme.",
+    "org.kde.Sdk.",
+    "org.kde.WaylandDecoration.",
+    "org.freedesktop.LinuxAudio.",
+)
+
+EXTENSION_COMPONENTS = (
+    "addon",
+    "addons",
+    "extension",
+    "extensions",
+    "plugin",
+    "plugins",
+)
+
+# Project hosting sites: <prefix><project>... -> domain, {} is the project
+HOSTED_PROJECTS = {
+    "io.frama.": "{}.frama.io",
+    "page.codeberg.": "{}.codeberg.page",
+    "io.sourceforge.": "{}.sourceforge.io",
+    "net.sourceforge.": "{}.sourceforge.io",
+}
+
+PSL_INDEX = os.environ.get(
+    "PSL_INDEX", os.path.expanduser("~/.cache/flathub-psl/publicsuffixlist.pickle")
+)
+
 
 def demangle(name: str) -> str:
     if name.startswith("_"):
@@ -23,6 +67,35 @@ def demangle(name: str) -> str:
     return name.replace("_", "-")
 
 
+@functools.lru_cache(maxsize=None)
+def get_psl() -> PublicSuffixList:
+    """Parse the suffix list once per process.
+
+    The parsed list is pickled to PSL_INDEX, keyed on the installed
+    publicsuffixlist version, so later processes skip parsing too.
+    """
+    version = importlib.metadata.version("publicsuffixlist")
+    try:
+        with open(PSL_INDEX, "rb") as f:
+            cached_version, psl = pickle.load(f)
+        if cached_version == version:
+            return psl
+    except Exception:
+        # Missing, truncated, or written by another publicsuffixlist/Python
+        # (unpickling can then raise nearly anything): just reparse
+        pass
+
+    psl = PublicSuffixList()
+    try:
+        os.makedirs(os.path.dirname(PSL_INDEX), exist_ok=True)
+        with open(PSL_INDEX, "wb") as f:
+            pickle.dump((version, psl), f)
+    except (OSError, pickle.PicklingError):
+        pass
+    return psl
+
+
+@functools.lru_cache(maxsize=None)
 def get_domain(appid: str) -> str:
     ret_none = "None"
 
@@ -35,59 +108,99 @@ def get_domain(appid: str) -> str:
     # correctly checking for extension requires checking out
     # untrusted code from PRs so rely on some heuristics
 
-    if appid.split(".")[-2].lower() in (
-        "addon",
-        "addons",
-        "extension",
-        "extensions",
-        "plugin",
-        "plugins",
-    ):
+    if appid.split(".")[-2].lower() in EXTENSION_COMPONENTS:
         return ret_none
 
-    if appid.startswith(
-        (
-            "org.freedesktop.Platform.",
-            "org.freedesktop.Sdk.",
-            "org.gnome.Platform.",
-            "org.gnome.Sdk.",
-            "org.gtk.Gtk3theme.",
-            "org.kde.KStyle.",
-            "org.kde.Platform.",
-            "org.kde.PlatformInputContexts.",
-            "org.kde.PlatformTheme.",
-            "org.kde.Sdk.",
-            "org.kde.WaylandDecoration.",
-            "org.freedesktop.LinuxAudio.",
-        )
-    ):
+    if appid.startswith(RUNTIMES):
         return ret_none
 
-    elif appid.startswith(
-        ("io.frama.", "page.codeberg.", "io.sourceforge.", "net.sourceforge.")
-    ):
-        tld, domain, name = appid.split(".")[0:3]
-        name = demangle(name)
-        if domain == "sourceforge":
-            return f"{name}.{domain}.io".lower()
-        else:
-            return f"{name}.{domain}.{tld}".lower()
-    elif appid.startswith(("io.sourceforge.", "net.sourceforge.")):
-        [tld, domain, projectname] = appid.split(".")[0:3]
-        projectname = demangle(projectname)
-        return f"{projectname}.{domain}.io".lower()
+    for prefix, domain in HOSTED_PROJECTS.items():
+        if appid.startswith(prefix):
+            name = demangle(appid.split(".")[2])
+            return domain.format(name).lower()
+
+    fqdn = ".".join(reversed(appid.split("."))).lower()
+    psl = get_psl()
+    if psl.is_private(fqdn):
+        return demangle(psl.privatesuffix(fqdn))
     else:
-        fqdn = ".".join(reversed(appid.split("."))).lower()
-        psl = PublicSuffixList()
-        if psl.is_private(fqdn):
-            return demangle(psl.privatesuffix(fqdn))
-        else:
-            return ".".join(
-                reversed([demangle(i) for i in appid.split(".")[:-1]])
-            ).lower()
+        return ".".join(reversed([demangle(i) for i in appid.split(".")[:-1]])).lower()
 
 
-if __name__ == "__main__":
+def appid_from_title(title: str) -> str:
     # PR title as input "(Aa)dd com.foo.bar"
-    appid = re.sub(r"^\s*add\s+", "", sys.argv[1], flags=re.IGNORECASE)
-    print(get_domain(appid).strip())
+    return re.sub(r"^\s*add\s+", "", title, flags=re.IGNORECASE).strip()
+
+
+def run_batch(lines) -> dict:
+    results = {}
+    for line in lines:
+        appid = appid_from_title(line)
+        if appid:
+            results[appid] = get_domain(appid).strip()
+    return results
+
+
+def run_benchmark(count: int) -> dict:
+    templates = (
+        "com.example{}.App",
+        "io.github.user{}.App",
+        "org.gnome.App{}",
+        "io.sourceforge.proj{}.App",
+        "page.codeberg.user{}.App",
+        "net.example{}.Tool.Plugins.Foo",
+        "io.gitlab.user{}.App",
+        "app.fly{}.dev.Tool",
+    )
+    appids = [templates[i % len(templates)].format(i) for i in range(count)]
+
+    start = time.perf_counter()
+    get_psl()
+    psl_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    run_batch(appids)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    run_batch(appids)
+    warm = time.perf_counter() - start
+
+    return {
+        "ids": count,
+        "psl_load_seconds": round(psl_load, 4),
+        "first_pass_seconds": round(cold, 4),
+        "memoized_pass_seconds": round(warm, 4),
+        "index": PSL_INDEX,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("title", nargs="?", help='PR title, e.g. "Add com.foo.bar"')
+    group.add_argument(
+        "--batch",
+        metavar="FILE",
+        type=argparse.FileType("r"),
+        help="read one title or app ID per line ('-' for stdin), print JSON",
+    )
+    group.add_argument(
+        "--benchmark",
+        metavar="N",
+        type=int,
+        help="time lookups for N synthetic app IDs",
+    )
+    args = parser.parse_args()
+
+    if args.batch:
+        json.dump(run_batch(args.batch), sys.stdout, indent=2)
+        print()
+    elif args.benchmark is not None:
+        print(json.dumps(run_benchmark(args.benchmark), indent=2))
+    else:
+        print(get_domain(appid_from_title(args.title)).strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import http.server
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import archive_eol  # noqa: E402
+
+REMOTE_LS = (
+    "app/org.old.App/x86_64/stable\teol=Use org.new.App\n"
+    "\n"
+    "app/org.rebased.App/aarch64/stable\teol-rebase=org.other.App\n"
+    "app/org.fine.App/x86_64/stable\t\n"
+    "app/org.old.App.Debug/x86_64/stable\teol=gone\n"
+    "app/org.extra.App/x86_64/stable\teol=gone\tunexpected\n"
+    "no-tab-here\n"
+)
+
+
+@pytest.fixture
+def stub_flatpak(tmp_path, monkeypatch):
+    """A fake `flatpak` that logs its arguments and prints canned output."""
+    calls = tmp_path / "calls"
+    output = tmp_path / "remote-ls.txt"
+    output.write_text(REMOTE_LS)
+    script = tmp_path / "flatpak"
+    script.write_text(
+        "#!/bin/sh\n"
+        'if [ "$1" = remotes ]; then\n'
+        "  printf 'flathub\\thttps://flathub.invalid/repo/\\n'\n"
+        "  printf 'flathub-beta\\thttps://flathub.invalid/beta/\\n'\n"
+        "  exit 0\n"
+        "fi\n"
+        f'echo "$@" >> "{calls}"\n'
+        f'cat "{output}"\n'
+        'exit "${STUB_EXIT:-0}"\n'
+    )
+    script.chmod(0o755)
+    monkeypatch.setattr(archive_eol, "FLATPAK", str(script))
+    monkeypatch.setattr(archive_eol, "REFS_CACHE_PATH", str(tmp_path / "refs.json"))
+    return calls
+
+
+def count_calls(calls) -> int:
+    return len(calls.read_text().splitlines()) if calls.exists() else 0
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("app/org.old.App/x86_64/stable\teol=reason\n", "org.old.App"),
+        ("app/org.old.App/aarch64/stable\teol-rebase=org.new.App", "org.old.App"),
+        ("app/org.fine.App/x86_64/stable\t\n", None),
+        ("app/org.fine.App/x86_64/stable\n", None),
+        ("\n", None),
+        ("", None),
+        ("no-tab-here\n", None),
+        ("app/org.extra.App/x86_64/stable\teol=x\textra\n", "org.extra.App"),
+        ("app/org.old.App.Debug/x86_64/stable\teol=x\n", None),
+        ("app/org.old.App/i386/stable\teol=x\n", None),
+    ],
+)
+def test_parse_remote_ls_line(line, expected):
+    assert archive_eol.parse_remote_ls_line(line) == expected
+
+
+def test_get_eol_refs_streams_stub_output(stub_flatpak):
+    refs = archive_eol.get_eol_refs("x86_64", "flathub")
+    assert refs == {"org.old.App", "org.rebased.App", "org.extra.App"}
+    assert stub_flatpak.read_text().split() == [
+        "remote-ls",
+        "--user",
+        "--arch=x86_64",
+        "--all",
+        "--columns=ref,options",
+        "flathub",
+    ]
+
+
+def test_get_eol_refs_failure_raises(stub_flatpak, monkeypatch):
+    monkeypatch.setenv("STUB_EXIT", "1")
+    with pytest.raises(subprocess.CalledProcessError):
+        archive_eol.get_eol_refs("x86_64", "flathub")
+
+
+def test_collect_eol_refs_uses_cache_while_checksum_unchanged(
+    stub_flatpak, monkeypatch
+):
+    checksum = {"value": "aaa"}
+    monkeypatch.setattr(archive_eol, "summary_checksum", lambda url: checksum["value"])
+    expected = {"org.old.App", "org.rebased.App", "org.extra.App"}
+
+    assert archive_eol.collect_eol_refs() == expected
+    assert count_calls(stub_flatpak) == 4
+
+    # Same summary checksum: every remote/arch comes from the cache
+    assert archive_eol.collect_eol_refs() == expected
+    assert count_calls(stub_flatpak) == 4
+
+    # The remote changed: everything is listed again
+    checksum["value"] = "bbb"
+    assert archive_eol.collect_eol_refs() == expected
+    assert count_calls(stub_flatpak) == 8
+
+
+def test_collect_eol_refs_without_checksum_does_not_cache(stub_flatpak, monkeypatch):
+    monkeypatch.setattr(archive_eol, "summary_checksum", lambda url: None)
+    archive_eol.collect_eol_refs()
+    archive_eol.collect_eol_refs()
+    assert count_calls(stub_flatpak) == 8
+
+
+class FakeGitHub(http.server.BaseHTTPRequestHandler):
+    """Serves a few flathub repos with ETags, like the REST API."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server.state
+        state["gets"].append(self.path)
+        if self.path == "/repos/flathub/org.limited.app" and not state["limited"]:
+            state["limited"] = True
+            # Rate limit that has already reset, so the pause is short
+            self.reply(
+                403,
+                {"message": "API rate limit exceeded"},
+                {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "0"},
+            )
+            return
+        body = state["routes"].get(self.path)
+        if body is None:
+            self.reply(404, {"message": "Not Found"})
+            return
+        etag = '"{}"'.format(abs(hash(json.dumps(body, sort_keys=True))))
+        if self.headers.get("If-None-Match") == etag:
+            self.reply(304, None, {"ETag": etag})
+            return
+        self.reply(200, body, {"ETag": etag})
+
+    def do_PATCH(self):
+        length = int(self.headers["Content-Length"])
+        data = json.loads(self.rfile.read(length))
+        self.server.state["patches"].append((self.path, data))
+        self.reply(200, {})
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def repo(name: str, committed: str) -> dict:
+    return {
+        f"/repos/flathub/{name}": {
+            "archived": False,
+            "default_branch": "master",
+            "html_url": f"https://github.com/flathub/{name}",
+        },
+        f"/repos/flathub/{name}/branches/master": {
+            "commit": {"commit": {"committer": {"date": committed}}}
+        },
+    }
+
+
+@pytest.fixture
+def fake_github(tmp_path, monkeypatch):
+    routes = {}
+    routes.update(repo("org.old.app", "2020-01-01T00:00:00Z"))
+    routes.update(repo("org.limited.app", "2999-01-01T00:00:00Z"))
+    # Missing default_branch: a KeyError in the worker
+    routes["/repos/flathub/org.broken.app"] = {"archived": False}
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHub)
+    server.state = {"routes": routes, "gets": [], "patches": [], "limited": False}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    refs = {"org.old.App", "org.gone.App", "org.limited.App", "org.broken.App"}
+    monkeypatch.setenv("GITHUB_TOKEN", "token")
+    monkeypatch.setattr(
+        archive_eol, "API_URL", f"http://127.0.0.1:{server.server_port}"
+    )
+    monkeypatch.setattr(archive_eol, "collect_eol_refs", lambda: refs)
+    monkeypatch.setattr(archive_eol, "CACHE_PATH", str(tmp_path / "api.json"))
+    monkeypatch.setattr(archive_eol, "SUMMARY_PATH", str(tmp_path / "summary.json"))
+    yield server.state, tmp_path / "summary.json"
+    server.shutdown()
+    server.server_close()
+
+
+def test_main_against_fake_api(fake_github):
+    state, summary_path = fake_github
+
+    archive_eol.main()
+    summary = json.loads(summary_path.read_text())
+    assert summary["repos_checked"] == 4
+    assert summary["archived"] == ["https://github.com/flathub/org.old.app"]
+    assert list(summary["errors"]) == ["org.broken.app"]
+    assert summary["errors"]["org.broken.app"].startswith("KeyError")
+    # The 403 paused the workers and was retried
+    assert summary["api_calls"]["rate_limited"] == 1
+    assert state["gets"].count("/repos/flathub/org.limited.app") == 2
+    assert "not_modified" not in summary["api_calls"]
+    assert state["patches"] == [
+        ("/repos/flathub/org.old.app", {"description": archive_eol.ARCHIVE_DESC}),
+        ("/repos/flathub/org.old.app", {"archived": True}),
+    ]
+
+    # Second run: everything that had an ETag comes back 304
+    archive_eol.main()
+    summary = json.loads(summary_path.read_text())
+    assert summary["api_calls"]["not_modified"] == 5
+    assert "rate_limited" not in summary["api_calls"]
@@ -0,0 +1,181 @@
+import http.server
+import json
+import os
+import sys
+import threading
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import archive_orphan  # noqa: E402
+
+RATE_LIMIT = {"cost": 1, "remaining": 5000, "resetAt": "2999-01-01T00:00:00Z"}
+
+
+def node(name: str, pushed: str, collaborators=0) -> dict:
+    return {
+        "name": name,
+        "url": f"https://github.com/flathub/{name}",
+        "isArchived": False,
+        "pushedAt": pushed,
+        "defaultBranchRef": {"target": {"committedDate": pushed}},
+        "collaborators": (
+            {"totalCount": collaborators} if collaborators is not None else None
+        ),
+    }
+
+
+# Two pages keyed by the cursor they are requested with, newest push first
+PAGES = {
+    None: {
+        "nodes": [
+            node("org.new.App", "2024-03-01T00:00:00Z"),
+            # No access to the collaborators: a per-field error, data is null
+            node("org.private.App", "2024-02-01T00:00:00Z", collaborators=None),
+        ],
+        "pageInfo": {"hasNextPage": True, "endCursor": "page2"},
+    },
+    "page2": {
+        "nodes": [node("org.old.App", "2020-01-01T00:00:00Z")],
+        "pageInfo": {"hasNextPage": False, "endCursor": "end"},
+    },
+}
+
+
+class FakeGraphQL(http.server.BaseHTTPRequestHandler):
+    """Answers the repository query from PAGES, after any queued failures."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        state = self.server.state
+        length = int(self.headers["Content-Length"])
+        variables = json.loads(self.rfile.read(length))["variables"]
+        state["requests"].append(variables)
+        if state["failures"]:
+            status, headers = state["failures"].pop(0)
+            self.reply(status, {"message": "error"}, headers)
+            return
+
+        page = PAGES[variables["cursor"]]
+        body = {
+            "data": {
+                "rateLimit": RATE_LIMIT,
+                "organization": {"repositories": page},
+            }
+        }
+        if any(n["collaborators"] is None for n in page["nodes"]):
+            body["errors"] = [{"type": "FORBIDDEN", "path": ["collaborators"]}]
+        self.reply(200, body)
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def fake_graphql(tmp_path, monkeypatch):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeGraphQL)
+    server.state = {"requests": [], "failures": []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    url = f"http://127.0.0.1:{server.server_port}/graphql"
+    monkeypatch.setattr(archive_orphan, "GRAPHQL_URL", url)
+    monkeypatch.setattr(archive_orphan, "STATE_PATH", str(tmp_path / "state.json"))
+    monkeypatch.setattr(
+        archive_orphan, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.json")
+    )
+    monkeypatch.setattr(archive_orphan, "INCREMENTAL", False)
+    yield server.state
+    server.shutdown()
+    server.server_close()
+
+
+def test_full_scan(fake_graphql):
+    state = {"repos": {"org.deleted.App": {}}}
+    archive_orphan.scan(requests.Session(), state)
+
+    assert [r["cursor"] for r in fake_graphql["requests"]] == [None, "page2"]
+    assert {r["order"] for r in fake_graphql["requests"]} == {"CREATED_AT"}
+    # Rebuilt from scratch, dropping repos that are gone from the org
+    assert sorted(state["repos"]) == ["org.new.App", "org.old.App", "org.private.App"]
+    assert state["repos"]["org.old.App"]["collaborators"] == 0
+    # Unknown collaborators count as maintained
+    assert state["repos"]["org.private.App"]["collaborators"] == 1
+    assert state["last_run"]
+    assert not os.path.exists(archive_orphan.CHECKPOINT_PATH)
+    assert archive_orphan.load_json(archive_orphan.STATE_PATH, None) == state
+
+
+def test_resumes_from_checkpoint(fake_graphql):
+    state = {"repos": {"org.new.App": {"kept": True}}}
+    archive_orphan.save_json(
+        archive_orphan.CHECKPOINT_PATH,
+        {
+            "mode": "full",
+            "since": None,
+            "started": "2024-04-01T00:00:00+00:00",
+            "cursor": "page2",
+        },
+    )
+    archive_orphan.scan(requests.Session(), state)
+
+    assert [r["cursor"] for r in fake_graphql["requests"]] == ["page2"]
+    # Repos fetched before the interruption are kept
+    assert sorted(state["repos"]) == ["org.new.App", "org.old.App"]
+    assert state["last_run"] == "2024-04-01T00:00:00+00:00"
+    assert not os.path.exists(archive_orphan.CHECKPOINT_PATH)
+
+
+def test_incremental_scan_stops_at_last_run(fake_graphql, monkeypatch):
+    monkeypatch.setattr(archive_orphan, "INCREMENTAL", True)
+    old = node("org.old.App", "2020-01-01T00:00:00Z")
+    state = {
+        "last_run": "2024-02-15T00:00:00+00:00",
+        "repos": {"org.old.App": archive_orphan.repo_record(old)},
+    }
+    archive_orphan.scan(requests.Session(), state)
+
+    # org.private.App wasn't pushed since the last run: stop there, without
+    # fetching page 2, and keep the stored repos
+    assert [r["cursor"] for r in fake_graphql["requests"]] == [None]
+    assert fake_graphql["requests"][0]["order"] == "PUSHED_AT"
+    assert sorted(state["repos"]) == ["org.new.App", "org.old.App"]
+    assert state["last_run"] != "2024-02-15T00:00:00+00:00"
+
+
+def test_retries_rate_limits_and_server_errors(fake_graphql):
+    fake_graphql["failures"] = [
+        (429, {"Retry-After": "0"}),
+        (502, {"Retry-After": "0"}),
+        (403, {"Retry-After": "0"}),
+    ]
+    data = archive_orphan.graphql(
+        requests.Session(),
+        {"org": "flathub", "first": 1, "cursor": None, "order": "CREATED_AT"},
+    )
+    assert data["organization"]["repositories"] == PAGES[None]
+    assert len(fake_graphql["requests"]) == 4
+
+
+def test_retries_are_capped(fake_graphql):
+    fake_graphql["failures"] = [(502, {"Retry-After": "0"})] * 10
+    with pytest.raises(requests.HTTPError):
+        archive_orphan.graphql(requests.Session(), {"cursor": None})
+    assert len(fake_graphql["requests"]) == archive_orphan.MAX_RETRIES + 1
+
+
+def test_permission_403_is_not_retried(fake_graphql):
+    fake_graphql["failures"] = [(403, {"X-RateLimit-Remaining": "4999"})]
+    with pytest.raises(requests.HTTPError):
+        archive_orphan.graphql(requests.Session(), {"cursor": None})
+    assert len(fake_graphql["requests"]) == 1
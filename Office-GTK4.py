@@ -1,6 +1,17 @@
 import os
+import re
 import sys
+import json
+import time
+import hashlib
+import signal
+import pstats
+import cProfile
+import threading
+import traceback
+import tracemalloc
 import subprocess
+import urllib.parse
 import gi
 gi.require_version("Gtk",    "4.0")
 gi.require_version("Adw",    "1")
@@ -28,12 +39,206 @@ APP_URL_PATTERNS = {
     "Outlook":    ["outlook.office.com", "outlook.live.com"],
 }
 
+# Sign-in, consent and picker pages that only ever live for a few seconds.
+# New-window requests for these open in a throwaway popup, never in a tab.
+POPUP_URL_PATTERNS = [
+    "login.microsoftonline.com",
+    "login.live.com",
+    "login.windows.net",
+    "account.live.com",
+    "/oauth2/",
+    "/adminconsent",
+    "/FilePicker",
+    "/picker",
+]
+
+POPUP_DEFAULT_SIZE = (520, 640)
+
+# Content blocking. Requests to these hosts (and their subdomains) are pure
+# telemetry/analytics beacons; nothing in sign-in or document storage uses
+# them. Extra rule lists (WebKit content-blocker JSON) can be dropped into
+# <data dir>/Office-GTK4/content-filters/*.json.
+BLOCKED_HOSTS = [
+    "browser.events.data.microsoft.com",
+    "self.events.data.microsoft.com",
+    "mobile.events.data.microsoft.com",
+    "browser.pipe.aria.microsoft.com",
+    "nexus.officeapps.live.com",
+    "nexusrules.officeapps.live.com",
+    "dc.services.visualstudio.com",
+    "in.applicationinsights.azure.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "clarity.ms",
+]
+
+# Sign-in and document storage. Appended as ignore-previous-rules to every
+# compiled list, so no rule list can ever block them.
+ALLOWED_HOSTS = [
+    "login.microsoftonline.com",
+    "login.live.com",
+    "login.windows.net",
+    "aadcdn.msauth.net",
+    "sharepoint.com",
+    "onedrive.live.com",
+    "storage.live.com",
+    "1drv.com",
+    "graph.microsoft.com",
+]
+
+# Counts script-initiated requests to BLOCKED_HOSTS (which the filter then
+# drops) and reports them to the app, for the per-tab counters. Reports are
+# ignored until the default filter is attached, and rules from user lists
+# aren't counted. Never injected into popups or pages on ALLOWED_HOSTS, so
+# sign-in runs with the page's own fetch/XHR untouched.
+BLOCK_COUNTER_JS = """
+(() => {
+    const hosts = %s;
+    const handler = window.webkit.messageHandlers.officeBlocked;
+    const report = (url) => {
+        try {
+            const h = new URL(String(url), location.href).hostname;
+            if (hosts.some(d => h === d || h.endsWith("." + d)))
+                handler.postMessage(h);
+        } catch (e) {}
+    };
+    const fetch = window.fetch;
+    window.fetch = function (input, init) {
+        report(input && input.url ? input.url : input);
+        return fetch.apply(this, arguments);
+    };
+    const open = XMLHttpRequest.prototype.open;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        report(url);
+        return open.apply(this, arguments);
+    };
+    if (navigator.sendBeacon) {
+        const beacon = navigator.sendBeacon.bind(navigator);
+        navigator.sendBeacon = (url, data) => { report(url); return beacon(url, data); };
+    }
+})();
+"""
+
+# When the network comes back, failed tabs are reloaded one by one, the first
+# after RECONNECT_DELAY_MS and each following one RECONNECT_STAGGER_MS later.
+RECONNECT_DELAY_MS   = 1000
+RECONNECT_STAGGER_MS = 1500
+
+# Outlook companion: with OFFICE_GTK4_OUTLOOK_COMPANION=1 (or the
+# app.outlook-companion action) closing the window keeps one hidden, throttled
+# Outlook view running that only raises mail notifications.
+COMPANION_ENV             = "OFFICE_GTK4_OUTLOOK_COMPANION"
+OUTLOOK_URL               = dict(OFFICE_APPS)["Outlook"]
+# Inside Flatpak, WebKit starts web processes in a sub-sandbox through the
+# portal, where this app can't see their PIDs. Their memory is bounded by
+# WebKit's limit instead (an overrun kills the process, which is logged and
+# reloaded); the periodic RSS check covers the UI process, plus the web
+# processes when they do run as visible children (non-Flatpak installs).
+COMPANION_MEMORY_ENV       = "OFFICE_GTK4_COMPANION_MEMORY_MB"
+COMPANION_MEMORY_LIMIT_MB  = 256   # web process limit enforced by WebKit
+COMPANION_UI_RSS_BUDGET_MB = 150   # UI process, checked periodically
+COMPANION_RSS_CHECK_SECONDS = 300
+# A terminated web process is reloaded after a delay that doubles each time;
+# after this many memory-limit kills the companion gives up and says so.
+COMPANION_RELOAD_DELAY_SECONDS = 30
+COMPANION_MAX_MEMORY_KILLS     = 3
+
+# Web process sharing between tabs. Views in the same group are created as
+# related views and share one web process; the choice can be changed at
+# runtime with the app.process-model action and applies to new tabs.
+#   shared         every tab in one process (least memory)
+#   per-app        one process per app (track_label); untracked tabs share
+#   isolate-heavy  HEAVY_APPS get their own process, everything else shares
+PROCESS_MODELS        = ("shared", "per-app", "isolate-heavy")
+DEFAULT_PROCESS_MODEL = os.environ.get("OFFICE_GTK4_PROCESS_MODEL", "shared")
+HEAVY_APPS            = {"Excel", "PowerPoint"}
+
+# Untracked tabs (Ctrl+T, target="_blank") have no app switcher button. Above
+# this many live ones the oldest background one is unloaded; above twice as
+# many in total the oldest unloaded one is closed.
+MAX_UNTRACKED_TABS = int(os.environ.get("OFFICE_GTK4_MAX_HIDDEN_TABS", "8"))
+
+# Query parameters that only say how a document was reached, not which one.
+# Dropped when comparing URLs to find an already-open document.
+VOLATILE_URL_PARAMS = {
+    "action", "mobileredirect", "wdorigin", "wdexp", "wdprevioussession",
+    "wdprevioussessionsrc", "wdenableroaming", "ct", "cid", "web", "sw",
+    "login_hint", "auth", "ui", "rs", "ref",
+}
+
+# In low-power mode, background tabs idle longer than this are unloaded (page
+# swapped for about:blank) and reloaded when selected again. On AC power
+# tabs are left alone so in-page state of open documents survives.
+LOW_POWER_IDLE_UNLOAD_SECONDS = 10 * 60
+IDLE_SWEEP_SECONDS            = 60
+# Never unloaded: Outlook has to stay live to receive mail
+HIBERNATE_EXEMPT              = {"Outlook"}
+
+# Diagnostics. Set OFFICE_GTK4_STALL_MS=<ms> to enable the main-loop watchdog.
+STALL_THRESHOLD_ENV   = "OFFICE_GTK4_STALL_MS"
+HEARTBEAT_INTERVAL_MS = 100
+LOW_POWER_HEARTBEAT_INTERVAL_MS = 1000
+
 USER_AGENT = (
     "Mozilla/5.0 (X11; Linux x86_64) "
     "AppleWebKit/537.36 (KHTML, like Gecko) "
     "Chrome/130.0.0.0 Safari/537.36"
 )
 
+# WebView settings profiles (WebKit.Settings properties, applied on top of
+# WEBVIEW_BASE_SETTINGS). Views with the same profile share one Settings
+# object. Named apps pick theirs from APP_PROFILES, everything else by URL.
+WEBVIEW_BASE_SETTINGS = {
+    "user_agent":                           USER_AGENT,
+    "enable_javascript":                    True,
+    "enable_javascript_markup":             True,
+    "allow_top_navigation_to_data_urls":    False,
+    "media_playback_requires_user_gesture": True,
+}
+
+WEBVIEW_PROFILES = {
+    # Word / Excel / PowerPoint / OneNote editors and the Office home page
+    "default": {
+        "enable_media":                 True,
+        "enable_webgl":                 True,
+        "enable_webaudio":              True,
+        "hardware_acceleration_policy": WebKit.HardwareAccelerationPolicy.ALWAYS,
+    },
+    # Mail and calendar: no 3D or audio graph, just <audio> for the chime
+    "outlook": {
+        "enable_media":                 True,
+        "enable_webgl":                 False,
+        "enable_webaudio":              False,
+        "hardware_acceleration_policy": WebKit.HardwareAccelerationPolicy.ALWAYS,
+    },
+    # Sign-in / consent / picker popups: short-lived forms, no GPU context
+    "popup": {
+        "enable_media":                 False,
+        "enable_webgl":                 False,
+        "enable_webaudio":              False,
+        "enable_page_cache":            False,
+        "hardware_acceleration_policy": WebKit.HardwareAccelerationPolicy.NEVER,
+    },
+    # Hidden Outlook notification companion: nothing is ever drawn
+    "companion": {
+        "enable_media":                 False,
+        "enable_webgl":                 False,
+        "enable_webaudio":              False,
+        "enable_page_cache":            False,
+        "enable_smooth_scrolling":      False,
+        "hardware_acceleration_policy": WebKit.HardwareAccelerationPolicy.NEVER,
+    },
+}
+
+APP_PROFILES = {"Outlook": "outlook"}
+
+# Applied on top of any profile in low-power mode
+LOW_POWER_SETTINGS = {
+    "enable_webgl":            False,
+    "enable_webaudio":         False,
+    "enable_smooth_scrolling": False,
+}
+
 APP_CSS = """
 /* ── App switcher buttons (Office / Word / Excel …) ── */
 
@@ -132,6 +337,251 @@ button.tab-close:hover {
 }
 """.encode()
 
+# Diagnostics
+
+class MainLoopWatchdog:
+    """
+    Detects GLib main-loop stalls. A heartbeat source on the main loop stamps
+    the time it last ran; a daemon thread watches that stamp and, once per
+    stall longer than threshold_ms, dumps the main thread's Python stack to
+    <report_dir>/stalls.log.
+    """
+    def __init__(self, report_dir: str, threshold_ms: int,
+                 interval_ms: int = HEARTBEAT_INTERVAL_MS):
+        self.report_dir  = report_dir
+        self.threshold   = threshold_ms / 1000.0
+        self.interval_ms = interval_ms
+        self.max_latency = 0.0            # worst heartbeat lateness seen, seconds
+        self._main_ident = threading.main_thread().ident
+        self._last_beat  = time.monotonic()
+        self._expected   = self._last_beat
+        self._source_id  = None
+        self._stop       = threading.Event()
+        self._thread     = None
+
+    def start(self):
+        self._schedule()
+        self._thread = threading.Thread(
+            target=self._watch, name="mainloop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def set_interval(self, interval_ms: int):
+        """Change the heartbeat rate (main thread only)."""
+        self.interval_ms = interval_ms
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._schedule()
+
+    def _schedule(self):
+        self._last_beat = time.monotonic()
+        self._expected  = self._last_beat + self.interval_ms / 1000.0
+        self._source_id = GLib.timeout_add(self.interval_ms, self._on_heartbeat)
+
+    def _on_heartbeat(self):
+        now = time.monotonic()
+        self.max_latency = max(self.max_latency, now - self._expected)
+        self._last_beat  = now
+        self._expected   = now + self.interval_ms / 1000.0
+        return GLib.SOURCE_CONTINUE
+
+    def _watch(self):
+        reported = False
+        while not self._stop.wait(min(self.threshold / 2, 0.5)):
+            overdue = time.monotonic() - self._last_beat - self.interval_ms / 1000.0
+            if overdue < self.threshold:
+                reported = False
+            elif not reported:
+                reported = True
+                self._report(overdue)
+
+    def _report(self, overdue: float):
+        frame = sys._current_frames().get(self._main_ident)
+        stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>\n"
+        text  = (f"--- {time.strftime('%Y-%m-%d %H:%M:%S')} main loop stalled "
+                 f"for {overdue * 1000:.0f} ms ---\n{stack}")
+        print(text, file=sys.stderr, end="")
+        try:
+            os.makedirs(self.report_dir, exist_ok=True)
+            with open(os.path.join(self.report_dir, "stalls.log"), "a") as f:
+                f.write(text)
+        except OSError:
+            pass
+
+
+class Profiler:
+    """
+    On-demand cProfile and tracemalloc sessions. Each toggle starts a session
+    or stops it and writes a report under report_dir, returning its path.
+    """
+    def __init__(self, report_dir: str):
+        self.report_dir     = report_dir
+        self._profile       = None
+        self._malloc_before = None
+
+    def toggle_cprofile(self):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            return None
+        self._profile.disable()
+        path = self._report_path("cprofile", "txt")
+        with open(path, "w") as f:
+            stats = pstats.Stats(self._profile, stream=f)
+            stats.sort_stats("cumulative").print_stats(60)
+        self._profile.dump_stats(path[:-len("txt")] + "prof")
+        self._profile = None
+        return path
+
+    def toggle_tracemalloc(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self._malloc_before = tracemalloc.take_snapshot()
+            return None
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        path = self._report_path("tracemalloc", "txt")
+        with open(path, "w") as f:
+            for stat in after.compare_to(self._malloc_before, "traceback")[:50]:
+                f.write(f"{stat}\n")
+                for line in stat.traceback.format():
+                    f.write(f"    {line}\n")
+        self._malloc_before = None
+        return path
+
+    def _report_path(self, kind: str, ext: str) -> str:
+        os.makedirs(self.report_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.report_dir, f"{kind}-{stamp}.{ext}")
+
+# Outlook companion
+
+class OutlookCompanion:
+    """
+    Keeps a single Outlook view alive after the main window has closed, only
+    so mail notifications keep arriving. The view lives in a window that is
+    never shown (so WebKit throttles it as a hidden page), uses the minimal
+    "companion" settings and its own web context with a memory limit.
+    """
+    def __init__(self, app):
+        self.app          = app
+        self.peak_rss     = 0
+        self.reloads      = 0
+        self.memory_kills = 0
+        self._reload_source = None
+
+        try:
+            self.memory_limit = int(os.environ.get(COMPANION_MEMORY_ENV, "0"))
+        except ValueError:
+            self.memory_limit = 0
+        if self.memory_limit <= 0:
+            self.memory_limit = COMPANION_MEMORY_LIMIT_MB
+
+        pressure = WebKit.MemoryPressureSettings.new()
+        pressure.set_memory_limit(self.memory_limit)
+        context = WebKit.WebContext(memory_pressure_settings=pressure)
+        context.connect("initialize-notification-permissions",
+                        self._on_init_notification_permissions)
+
+        props = dict(WEBVIEW_BASE_SETTINGS)
+        props.update(WEBVIEW_PROFILES["companion"])
+        self.wv = WebKit.WebView(
+            web_context=context,
+            network_session=app.get_session(),
+            settings=WebKit.Settings(**props),
+        )
+        self.wv.connect("show-notification",  app.on_web_notification)
+        self.wv.connect("permission-request", self._on_permission_request)
+        self.wv.connect("web-process-terminated", self._on_web_process_terminated)
+
+        self.window = Gtk.Window()
+        self.window.set_child(self.wv)
+
+        self.wv.load_uri(OUTLOOK_URL)
+        self._rss_source = GLib.timeout_add_seconds(
+            COMPANION_RSS_CHECK_SECONDS, self._on_check_rss)
+
+    def stop(self):
+        if self._rss_source is not None:
+            GLib.source_remove(self._rss_source)
+            self._rss_source = None
+        if self._reload_source is not None:
+            GLib.source_remove(self._reload_source)
+            self._reload_source = None
+        self.window.destroy()
+
+    def _on_init_notification_permissions(self, context):
+        context.initialize_notification_permissions(
+            [WebKit.SecurityOrigin.new_for_uri(OUTLOOK_URL)], [])
+
+    def _on_permission_request(self, _wv, request):
+        if isinstance(request, WebKit.NotificationPermissionRequest):
+            request.allow()
+        else:
+            request.deny()
+        return True
+
+    def _on_web_process_terminated(self, _wv, reason):
+        if reason == WebKit.WebProcessTerminationReason.EXCEEDED_MEMORY_LIMIT:
+            self.memory_kills += 1
+            print(f"Outlook companion web process exceeded "
+                  f"{self.memory_limit} MB ({self.memory_kills}/"
+                  f"{COMPANION_MAX_MEMORY_KILLS})", file=sys.stderr)
+            if self.memory_kills >= COMPANION_MAX_MEMORY_KILLS:
+                # Reloading would only repeat the cycle; stopping destroys
+                # this view, so leave the signal handler first
+                GLib.idle_add(self.app.on_companion_failed, self)
+                return
+        if self._reload_source is not None:
+            return
+        delay = COMPANION_RELOAD_DELAY_SECONDS * 2 ** self.reloads
+        self.reloads += 1
+        self._reload_source = GLib.timeout_add_seconds(delay, self._on_reload_timeout)
+
+    def _on_reload_timeout(self):
+        self._reload_source = None
+        self.wv.reload()
+        return GLib.SOURCE_REMOVE
+
+    @staticmethod
+    def _rss_mb() -> tuple:
+        """RSS in MB of this process and of its visible descendants."""
+        parents, rss = {}, {}
+        for pid in filter(str.isdigit, os.listdir("/proc")):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    fields = dict(line.split(":", 1) for line in f if ":" in line)
+            except OSError:
+                continue
+            parents[int(pid)] = int(fields.get("PPid", "0"))
+            rss[int(pid)] = int(fields.get("VmRSS", "0 kB").split()[0])
+
+        own, children = os.getpid(), 0
+        for pid in rss:
+            p = parents.get(pid, 0)
+            while p and p != own:
+                p = parents.get(p, 0)
+            if p == own:
+                children += rss[pid]
+        return rss.get(own, 0) // 1024, children // 1024
+
+    def _on_check_rss(self):
+        ui_rss, child_rss = self._rss_mb()
+        rss    = ui_rss + child_rss
+        budget = COMPANION_UI_RSS_BUDGET_MB
+        if child_rss:
+            budget += self.memory_limit
+        self.peak_rss = max(self.peak_rss, rss)
+        if rss > budget:
+            print(f"Outlook companion RSS {rss} MB exceeds budget of "
+                  f"{budget} MB", file=sys.stderr)
+        return GLib.SOURCE_CONTINUE
+
 # Application
 
 class OfficeApp(Adw.Application):
@@ -140,9 +590,169 @@ class OfficeApp(Adw.Application):
             application_id="io.github.mrks1469.office-gtk4",
             flags=Gio.ApplicationFlags.FLAGS_NONE,
         )
+        self.win       = None
+        self.session   = None
+        self.companion = None
+
+    def do_startup(self):
+        Adw.Application.do_startup(self)
+        self._setup_diagnostics()
+        self._setup_actions()
+
+    def get_session(self) -> WebKit.NetworkSession:
+        """The one persistent network session, shared by all views."""
+        if self.session is not None:
+            return self.session
+
+        # Use GLib XDG dirs so the app works correctly both inside a Flatpak
+        # sandbox (~/.var/app/<id>/data|cache) and in a plain desktop install.
+        self.data_path  = os.path.join(GLib.get_user_data_dir(),  "Office-GTK4")
+        self.cache_path = os.path.join(GLib.get_user_cache_dir(), "Office-GTK4")
+        os.makedirs(self.data_path,  exist_ok=True)
+        os.makedirs(self.cache_path, exist_ok=True)
+
+        self.session = WebKit.NetworkSession.new(self.data_path, self.cache_path)
+        cm = self.session.get_cookie_manager()
+        cm.set_persistent_storage(
+            os.path.join(self.data_path, "cookies.sqlite"),
+            WebKit.CookiePersistentStorage.SQLITE,
+        )
+        return self.session
+
+    def _setup_actions(self):
+        model = DEFAULT_PROCESS_MODEL if DEFAULT_PROCESS_MODEL in PROCESS_MODELS else "shared"
+        self.process_model = model
+        action = Gio.SimpleAction.new_stateful(
+            "process-model", GLib.VariantType.new("s"), GLib.Variant("s", model))
+        action.connect("change-state", self._on_process_model_change)
+        self.add_action(action)
+
+        self.companion_enabled = os.environ.get(COMPANION_ENV) == "1"
+        action = Gio.SimpleAction.new_stateful(
+            "outlook-companion", None, GLib.Variant("b", self.companion_enabled))
+        action.connect("change-state", self._on_companion_toggled)
+        self.add_action(action)
+
+        action = Gio.SimpleAction.new("open-outlook", None)
+        action.connect("activate", self._on_open_outlook)
+        self.add_action(action)
+
+        # Closing the window doesn't exit while the companion is enabled
+        action = Gio.SimpleAction.new("quit", None)
+        action.connect("activate", self._on_quit)
+        self.add_action(action)
+        self.set_accels_for_action("app.quit", ["<Control>q"])
+
+    def _setup_diagnostics(self):
+        """
+        Profiling sessions are toggled with SIGUSR1 (cProfile) / SIGUSR2
+        (tracemalloc) or over D-Bus through the exported app actions, e.g.
+
+          gdbus call --session --dest io.github.mrks1469.office-gtk4 \\
+            --object-path /io/github/mrks1469/office_gtk4 \\
+            --method org.gtk.Actions.Activate toggle-profiler [] {}
+        """
+        report_dir = os.path.join(GLib.get_user_cache_dir(), "Office-GTK4", "diagnostics")
+        self.profiler = Profiler(report_dir)
+        self.watchdog = None
+
+        try:
+            threshold_ms = int(os.environ.get(STALL_THRESHOLD_ENV, "0"))
+        except ValueError:
+            threshold_ms = 0
+        if threshold_ms > 0:
+            self.watchdog = MainLoopWatchdog(report_dir, threshold_ms)
+            self.watchdog.start()
+
+        toggles = {
+            "toggle-profiler":    self.profiler.toggle_cprofile,
+            "toggle-tracemalloc": self.profiler.toggle_tracemalloc,
+        }
+        for name, toggle in toggles.items():
+            action = Gio.SimpleAction.new(name, None)
+            action.connect("activate", self._on_toggle_profiler, name, toggle)
+            self.add_action(action)
+
+        for signum, name in ((signal.SIGUSR1, "toggle-profiler"),
+                             (signal.SIGUSR2, "toggle-tracemalloc")):
+            GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, self._on_unix_signal, name)
+
+    def _on_toggle_profiler(self, _action, _param, name, toggle):
+        path = toggle()
+        print(f"{name}: report written to {path}" if path else f"{name}: started")
+
+    def _on_process_model_change(self, action, value):
+        model = value.get_string()
+        if model not in PROCESS_MODELS:
+            print(f"Unknown process model {model!r}, expected one of {PROCESS_MODELS}")
+            return
+        self.process_model = model
+        action.set_state(value)
+
+    def _on_unix_signal(self, name):
+        self.activate_action(name, None)
+        return GLib.SOURCE_CONTINUE
+
+    def _on_companion_toggled(self, action, value):
+        self.companion_enabled = value.get_boolean()
+        action.set_state(value)
+        if not self.companion_enabled:
+            self.stop_companion()
+
+    def _on_open_outlook(self, _action, _param):
+        self.activate()
+        self.win._switch_or_open("Outlook", OUTLOOK_URL)
+
+    def _on_quit(self, _action, _param):
+        self.companion_enabled = False
+        self.stop_companion()
+        self.quit()
+
+    def start_companion(self):
+        if self.companion is None:
+            self.companion = OutlookCompanion(self)
+            self.hold()
+
+    def stop_companion(self):
+        if self.companion is not None:
+            self.companion.stop()
+            self.companion = None
+            self.release()
+
+    def on_companion_failed(self, companion):
+        """Turn the companion off after repeated memory-limit kills."""
+        if companion is not self.companion:
+            return GLib.SOURCE_REMOVE   # already replaced by the window
+        memory_limit = companion.memory_limit
+        self.change_action_state("outlook-companion", GLib.Variant("b", False))
+        n = Gio.Notification.new("Outlook notifications stopped")
+        n.set_body(f"Outlook kept exceeding its {memory_limit} MB memory limit "
+                   f"(set {COMPANION_MEMORY_ENV} to raise it).")
+        n.set_default_action("app.open-outlook")
+        self.send_notification("companion-failed", n)
+        return GLib.SOURCE_REMOVE
+
+    def on_web_notification(self, _wv, notification):
+        """Raise a web notification as a desktop one that reopens Outlook."""
+        n = Gio.Notification.new(notification.get_title() or "Outlook")
+        body = notification.get_body()
+        if body:
+            n.set_body(body)
+        n.set_default_action("app.open-outlook")
+        n.add_button("Quit Office", "app.quit")
+        self.send_notification(notification.get_tag() or None, n)
+        return True
+
+    def on_window_closed(self, win):
+        if win is self.win:
+            self.win = None
+        if self.companion_enabled:
+            self.start_companion()
 
     def do_activate(self):
-        if not hasattr(self, "win") or self.win is None:
+        # The full window takes over from the companion
+        self.stop_companion()
+        if self.win is None:
             self.win = OfficeWindow(application=self)
         self.win.present()
 
@@ -156,12 +766,19 @@ class TabEntry:
         self.btn          = btn           # Gtk.Button in the custom tab strip
         self.label_widget = label_widget  # Gtk.Label inside the button
         self.track_label  = track_label   # e.g. "Word", or None for generic tabs
+        self.pending_uri  = None          # deferred or failed load, retried once online
+        self.hibernated_uri = None        # set while unloaded for being idle
+        self.blocked_requests = 0         # telemetry requests dropped by the content filter
+        self.profile      = "default"     # key into WEBVIEW_PROFILES
+        self.url_key      = None          # normalised URL, key in the open-tab index
+        self.process_key  = "shared"      # web process group, see PROCESS_MODELS
+        self.last_active  = time.monotonic()
 
 
 # Main Window
 
 class OfficeWindow(Adw.ApplicationWindow):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, network_monitor=None, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.set_default_size(1280, 900)
@@ -173,11 +790,28 @@ class OfficeWindow(Adw.ApplicationWindow):
         self._all_tabs: dict     = {}
         # App switcher buttons
         self._app_buttons: dict  = {}
-        self._root_wv            = None
+        # Open sign-in / helper popups: Adw.Window -> its WebView
+        self._popups: dict       = {}
+        # Compiled WebKit.UserContentFilter objects, added to every view
+        self._content_filters: list = []
+        # normalised URL -> TabEntry  (all tabs, for deduplication)
+        self._url_index: dict    = {}
+        # (profile, low_power) -> shared WebKit.Settings
+        self._settings_cache: dict  = {}
+        # TabEntry -> GLib source id of its scheduled reconnect reload
+        self._recovery_sources: dict = {}
+        self._active_entry       = None
+        # (object, handler id) on app-lifetime monitors, dropped on close
+        self._monitor_handlers: list = []
+        self._closed             = False
 
         self._load_css()
         self._setup_session()
+        self._setup_content_filters()
+        self._setup_network_monitor(network_monitor)
+        self._setup_power_monitor()
         self._build_ui()
+        self.connect("close-request", self._on_close_request)
 
         self._open_tab("https://www.office.com", "Office", track_label="Office")
 
@@ -193,19 +827,127 @@ class OfficeWindow(Adw.ApplicationWindow):
 
     # Session
     def _setup_session(self):
-        # Use GLib XDG dirs so the app works correctly both inside a Flatpak
-        # sandbox (~/.var/app/<id>/data|cache) and in a plain desktop install.
-        data_path  = os.path.join(GLib.get_user_data_dir(),  "Office-GTK4")
-        cache_path = os.path.join(GLib.get_user_cache_dir(), "Office-GTK4")
-        os.makedirs(data_path,  exist_ok=True)
-        os.makedirs(cache_path, exist_ok=True)
+        # The session belongs to the app so the Outlook companion can keep
+        # using it (and its cookies) after this window is gone.
+        app = self.get_application()
+        self.session    = app.get_session()
+        self.data_path  = app.data_path
+        self.cache_path = app.cache_path
+
+    # Content filters
+    def _setup_content_filters(self):
+        """
+        Compile the built-in and user rule lists with WebKit's content
+        blocker. Compiled lists are stored under the cache dir keyed by a
+        hash of their source, so later startups just load them.
+        """
+        self._counting_blocked = False   # set once the default list is attached
+        self._filter_store = WebKit.UserContentFilterStore.new(
+            os.path.join(self.cache_path, "content-filters"))
+
+        rule_lists = {"default": [self._host_rule(h, "block") for h in BLOCKED_HOSTS]}
+        user_dir = os.path.join(self.data_path, "content-filters")
+        if os.path.isdir(user_dir):
+            for name in sorted(os.listdir(user_dir)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(user_dir, name)) as f:
+                        rules = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Ignoring content filter {name}: {e}", file=sys.stderr)
+                    continue
+                if isinstance(rules, list):
+                    rule_lists[f"user-{name[:-5]}"] = rules
+
+        allow  = [self._host_rule(h, "ignore-previous-rules") for h in ALLOWED_HOSTS]
+        wanted = {}
+        for name, rules in rule_lists.items():
+            source = json.dumps(rules + allow).encode()
+            ident  = f"{name}-{hashlib.sha256(source).hexdigest()[:16]}"
+            wanted[ident] = source
+            self._filter_store.load(ident, None, self._on_filter_loaded, ident, source)
+
+        # Drop compiled lists whose source has since changed or gone away
+        self._filter_store.fetch_identifiers(None, self._on_filter_identifiers, wanted)
+
+    @staticmethod
+    def _host_rule(host: str, action: str) -> dict:
+        pattern = "^https?://([^/]*\\.)?" + re.escape(host) + "[:/]"
+        return {"trigger": {"url-filter": pattern}, "action": {"type": action}}
+
+    def _on_filter_loaded(self, store, result, ident, source):
+        try:
+            content_filter = store.load_finish(result)
+        except GLib.Error:
+            # Not compiled yet (or stale format): compile and cache it now
+            store.save(ident, GLib.Bytes.new(source), None, self._on_filter_saved, ident)
+            return
+        self._add_content_filter(content_filter)
 
-        self.session = WebKit.NetworkSession.new(data_path, cache_path)
-        cm = self.session.get_cookie_manager()
-        cm.set_persistent_storage(
-            os.path.join(data_path, "cookies.sqlite"),
-            WebKit.CookiePersistentStorage.SQLITE,
-        )
+    def _on_filter_saved(self, store, result, ident):
+        try:
+            content_filter = store.save_finish(result)
+        except GLib.Error as e:
+            print(f"Content filter {ident} failed to compile: {e.message}", file=sys.stderr)
+            return
+        self._add_content_filter(content_filter)
+
+    def _on_filter_identifiers(self, store, result, wanted):
+        for ident in store.fetch_identifiers_finish(result) or []:
+            if ident not in wanted:
+                store.remove(ident, None, None)
+
+    def _add_content_filter(self, content_filter):
+        self._content_filters.append(content_filter)
+        if content_filter.get_identifier().startswith("default-"):
+            self._counting_blocked = True
+        views = [e.wv for e in self._all_tabs.values()] + list(self._popups.values())
+        for wv in views:
+            wv.get_user_content_manager().add_filter(content_filter)
+
+    # Network
+    def _setup_network_monitor(self, monitor=None):
+        # Anything with get_network_available() and a "network-changed"
+        # signal will do, so tests can pass a fake monitor.
+        self._net_monitor = monitor or Gio.NetworkMonitor.get_default()
+        self._online      = self._net_monitor.get_network_available()
+        self._monitor_handlers.append((self._net_monitor, self._net_monitor.connect(
+            "network-changed", self._on_network_changed)))
+
+    # Power
+    def _setup_power_monitor(self):
+        # Low-power mode = power-saver profile active or running on battery.
+        self._power_saver = False
+        self._on_battery  = False
+        self._low_power   = False
+
+        self._power_monitor = Gio.PowerProfileMonitor.dup_default()
+        self._monitor_handlers.append((self._power_monitor, self._power_monitor.connect(
+            "notify::power-saver-enabled", self._on_power_changed)))
+        self._power_saver = self._power_monitor.get_power_saver_enabled()
+
+        # Battery state comes from UPower; without it we only follow power-saver.
+        Gio.DBusProxy.new_for_bus(
+            Gio.BusType.SYSTEM, Gio.DBusProxyFlags.NONE, None,
+            "org.freedesktop.UPower", "/org/freedesktop/UPower",
+            "org.freedesktop.UPower", None, self._on_upower_proxy_ready)
+
+        self._idle_sweep_source = GLib.timeout_add_seconds(
+            IDLE_SWEEP_SECONDS, self._on_idle_sweep)
+        self._update_power_mode()
+
+    def _on_upower_proxy_ready(self, _source, result):
+        try:
+            upower = Gio.DBusProxy.new_for_bus_finish(result)
+        except GLib.Error:
+            return
+        if self._closed:
+            return
+        self._upower = upower
+        self._monitor_handlers.append((upower, upower.connect(
+            "g-properties-changed", self._on_power_changed)))
+        self._on_power_changed()
 
     # UI
     def _build_ui(self):
@@ -225,7 +967,7 @@ class OfficeWindow(Adw.ApplicationWindow):
         self._add_nav_btn(nav_group, "go-next-symbolic",
                           lambda: self._current_wv().go_forward(), "Forward")
         self._add_nav_btn(nav_group, "view-refresh-symbolic",
-                          lambda: self._current_wv().reload(), "Reload")
+                          lambda: self._reload(self._current_wv()), "Reload")
         header.pack_start(nav_group)
 
         # App switcher
@@ -245,6 +987,24 @@ class OfficeWindow(Adw.ApplicationWindow):
         self.close_tab_btn.connect("clicked", self._on_close_tab_btn_clicked)
         header.pack_end(self.close_tab_btn)
 
+        # "+N" indicator for tabs with no app switcher button
+        self._hidden_list = Gtk.ListBox()
+        self._hidden_list.set_selection_mode(Gtk.SelectionMode.NONE)
+        self._hidden_list.connect("row-activated", self._on_hidden_row_activated)
+        popover = Gtk.Popover()
+        popover.set_child(self._hidden_list)
+        popover.connect("show", lambda _: self._rebuild_hidden_list())
+        self.hidden_tabs_btn = Gtk.MenuButton(popover=popover)
+        self.hidden_tabs_btn.add_css_class("flat")
+        self.hidden_tabs_btn.set_visible(False)
+        header.pack_end(self.hidden_tabs_btn)
+
+        # Tracking requests blocked in the current tab
+        self.blocked_label = Gtk.Label()
+        self.blocked_label.add_css_class("dim-label")
+        self.blocked_label.set_visible(False)
+        header.pack_end(self.blocked_label)
+
         self.spinner = Gtk.Spinner()
         header.pack_end(self.spinner)
 
@@ -355,6 +1115,9 @@ class OfficeWindow(Adw.ApplicationWindow):
         if is_closable:
             self.close_tab_btn.set_label(f"Close {active_entry.track_label}")
 
+        self._update_hidden_indicator()
+        self._update_blocked_label()
+
     def _on_close_tab_btn_clicked(self, _btn):
         page = self.tab_view.get_selected_page()
         if page:
@@ -394,9 +1157,10 @@ class OfficeWindow(Adw.ApplicationWindow):
     # WebView factory
       
 
-    def _make_webview(self, related_wv=None) -> WebKit.WebView:
-        anchor = related_wv if related_wv is not None else self._root_wv
-        kwargs = {}
+    def _make_webview(self, related_wv=None, profile: str = "default",
+                      process_key: str = "shared") -> WebKit.WebView:
+        anchor = related_wv if related_wv is not None else self._process_anchor(process_key)
+        kwargs = {"settings": self._get_settings(profile, self._low_power)}
         if anchor is not None:
             kwargs["related_view"] = anchor
         else:
@@ -406,16 +1170,21 @@ class OfficeWindow(Adw.ApplicationWindow):
         wv.set_hexpand(True)
         wv.set_vexpand(True)
 
-        s = wv.get_settings()
-        s.set_user_agent(USER_AGENT)
-        s.set_enable_javascript(True)
-        s.set_enable_javascript_markup(True)
-        s.set_enable_media(True)
-        s.set_enable_webgl(True)
-        s.set_enable_webaudio(True)
-        s.set_allow_top_navigation_to_data_urls(False)
-        s.set_media_playback_requires_user_gesture(True)
-        s.set_hardware_acceleration_policy(WebKit.HardwareAccelerationPolicy.ALWAYS)
+        ucm = wv.get_user_content_manager()
+        for content_filter in self._content_filters:
+            ucm.add_filter(content_filter)
+        if profile != "popup":
+            allowed = [p for h in ALLOWED_HOSTS
+                       for p in (f"https://{h}/*", f"https://*.{h}/*")]
+            ucm.add_script(WebKit.UserScript.new(
+                BLOCK_COUNTER_JS % json.dumps(BLOCKED_HOSTS),
+                WebKit.UserContentInjectedFrames.ALL_FRAMES,
+                WebKit.UserScriptInjectionTime.START,
+                None, allowed,
+            ))
+            ucm.register_script_message_handler("officeBlocked", None)
+            ucm.connect("script-message-received::officeBlocked",
+                        self._on_request_blocked, wv)
 
         white = Gdk.RGBA()
         white.parse("white")
@@ -423,6 +1192,44 @@ class OfficeWindow(Adw.ApplicationWindow):
 
         return wv
 
+    def _process_key(self, track_label: str = None) -> str:
+        model = getattr(self.get_application(), "process_model", "shared")
+        if model == "per-app" and track_label:
+            return track_label
+        if model == "isolate-heavy" and track_label in HEAVY_APPS:
+            return track_label
+        return "shared"
+
+    def _process_anchor(self, process_key: str):
+        """An open view of the group to relate to, or None for a new process."""
+        for entry in self._all_tabs.values():
+            if entry.process_key == process_key:
+                return entry.wv
+        return None
+
+    def _get_settings(self, profile: str, low_power: bool) -> WebKit.Settings:
+        """Shared Settings object for a profile, built on first use."""
+        key = (profile, low_power)
+        settings = self._settings_cache.get(key)
+        if settings is None:
+            props = dict(WEBVIEW_BASE_SETTINGS)
+            props.update(WEBVIEW_PROFILES[profile])
+            if low_power:
+                props.update(LOW_POWER_SETTINGS)
+            settings = WebKit.Settings(**props)
+            self._settings_cache[key] = settings
+        return settings
+
+    def _profile_for(self, track_label: str = None, uri: str = "") -> str:
+        if track_label is None:
+            if any(p in uri for p in POPUP_URL_PATTERNS):
+                return "popup"
+            for label in APP_PROFILES:
+                if any(p in uri for p in APP_URL_PATTERNS.get(label, ())):
+                    track_label = label
+                    break
+        return APP_PROFILES.get(track_label, "default")
+
       
     # Tab management
       
@@ -441,11 +1248,29 @@ class OfficeWindow(Adw.ApplicationWindow):
                   track_label: str = None,
                   related_wv=None,
                   track: bool = True):
-        wv = self._make_webview(related_wv)
+        if not (track and track_label):
+            existing = self._find_open_tab(url)
+            if existing is not None:
+                self._select_tab_entry(existing)
+                return
 
-        if self._root_wv is None:
-            self._root_wv = wv
+        profile     = self._profile_for(track_label, url)
+        process_key = self._process_key(track_label)
+        wv = self._make_webview(related_wv, profile, process_key)
 
+        entry = self._add_tab(wv, title, track_label, track)
+        entry.profile     = profile
+        entry.process_key = process_key
+        self._index_tab(entry, url)
+        if self._online:
+            wv.load_uri(url)
+        else:
+            entry.pending_uri = url   # loaded once the network is back
+
+    def _add_tab(self, wv, title: str,
+                 track_label: str = None,
+                 track: bool = True) -> TabEntry:
+        """Wrap an existing WebView in a tab, wire its signals and select it."""
         page = self.tab_view.append(wv)
         page.set_title(title)
 
@@ -465,10 +1290,150 @@ class OfficeWindow(Adw.ApplicationWindow):
         wv.connect("notify::is-loading", self._on_loading_changed)
         wv.connect("notify::title",      self._on_title_changed, entry)
         wv.connect("notify::uri",        self._on_uri_changed)
+        wv.connect("notify::uri",        self._on_tab_uri_changed, entry)
         wv.connect("create",             self._on_wv_create)
+        wv.connect("close",              self._on_wv_close, entry)
+        wv.connect("load-changed",       self._on_load_changed, entry)
+        wv.connect("load-failed",        self._on_load_failed, entry)
 
-        wv.load_uri(url)
         self.tab_view.set_selected_page(page)
+        self._enforce_untracked_cap()
+        return entry
+
+      
+    # Deduplication / untracked tabs
+      
+
+    @staticmethod
+    def _normalise_url(url: str) -> str:
+        """Key identifying the document behind url, or "" if there is none."""
+        if not url or not url.startswith(("http:", "https:")):
+            return ""
+        parts = urllib.parse.urlsplit(url)
+        query = sorted(
+            (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+            if k.lower() not in VOLATILE_URL_PARAMS
+        )
+        return urllib.parse.urlunsplit((
+            "https",
+            parts.netloc.lower(),
+            parts.path.rstrip("/") or "/",
+            urllib.parse.urlencode(query),
+            "",
+        ))
+
+    def _index_tab(self, entry: TabEntry, url: str):
+        if self._url_index.get(entry.url_key) is entry:
+            del self._url_index[entry.url_key]
+        entry.url_key = self._normalise_url(url)
+        if entry.url_key:
+            self._url_index.setdefault(entry.url_key, entry)
+
+    def _find_open_tab(self, url: str):
+        """The tab already showing the document at url, if any."""
+        key = self._normalise_url(url)
+        # Launcher / home pages aren't documents; Ctrl+T must still open one
+        if not key or key in {self._normalise_url(u) for _, u in OFFICE_APPS}:
+            return None
+        entry = self._url_index.get(key)
+        return entry if entry is not None and entry.page in self._all_tabs else None
+
+    def _hidden_tabs(self) -> list:
+        named = set(self._named_tabs.values())
+        return [e for e in self._all_tabs.values() if e not in named]
+
+    def _enforce_untracked_cap(self):
+        current    = self._current_wv()
+        hidden     = self._hidden_tabs()
+        background = sorted((e for e in hidden if e.wv is not current),
+                            key=lambda e: e.last_active)   # oldest first
+
+        # The selected tab, if hidden, counts as live but is never touched
+        live   = [e for e in background if not e.hibernated_uri]
+        n_live = len(live) + len(hidden) - len(background)
+        for entry in live[:max(0, n_live - MAX_UNTRACKED_TABS)]:
+            self._hibernate_tab(entry)
+
+        unloaded = [e for e in background if e.hibernated_uri]
+        for entry in unloaded[:max(0, len(hidden) - 2 * MAX_UNTRACKED_TABS)]:
+            self._close_tab_entry(entry)
+        self._update_hidden_indicator()
+
+    def _update_hidden_indicator(self):
+        n = len(self._hidden_tabs())
+        self.hidden_tabs_btn.set_visible(n > 0)
+        self.hidden_tabs_btn.set_label(f"+{n}")
+        self.hidden_tabs_btn.set_tooltip_text(
+            f"{n} tab{'s' if n != 1 else ''} without an app button")
+
+    def _rebuild_hidden_list(self):
+        while (row := self._hidden_list.get_row_at_index(0)) is not None:
+            self._hidden_list.remove(row)
+        for entry in self._hidden_tabs():
+            title = entry.page.get_title() or "New Tab"
+            if entry.blocked_requests:
+                title = f"{title}  ({entry.blocked_requests} blocked)"
+            label = Gtk.Label(label=title, xalign=0)
+            label.set_ellipsize(Pango.EllipsizeMode.END)
+            label.set_max_width_chars(40)
+            row = Gtk.ListBoxRow(child=label)
+            row.entry = entry
+            self._hidden_list.append(row)
+
+    def _on_hidden_row_activated(self, _listbox, row):
+        self.hidden_tabs_btn.popdown()
+        if row.entry.page in self._all_tabs:
+            self._select_tab_entry(row.entry)
+
+      
+    # Popups
+      
+
+    def _is_popup_request(self, uri: str, props) -> bool:
+        """
+        Sign-in and helper pages, or window.open() calls that ask for a sized
+        window without browser chrome, are popups. Plain target="_blank"
+        documents come with default window properties and stay tabs.
+        """
+        if any(p in uri for p in POPUP_URL_PATTERNS):
+            return True
+        if props is None:
+            return False
+        geom = props.get_geometry()
+        if geom is not None and geom.width > 0 and geom.height > 0:
+            return True
+        return not (props.get_toolbar_visible() and props.get_locationbar_visible())
+
+    def _open_popup(self, wv):
+        """Show wv in a small transient window that dies with the page."""
+        props  = wv.get_window_properties()
+        geom   = props.get_geometry() if props is not None else None
+        width, height = POPUP_DEFAULT_SIZE
+        if geom is not None and geom.width > 0 and geom.height > 0:
+            width, height = geom.width, geom.height
+
+        # Popups recognised only by their window features got the page's
+        # profile at creation time; switch them to the minimal one.
+        wv.set_settings(self._get_settings("popup", self._low_power))
+
+        popup = Adw.Window(transient_for=self, destroy_with_parent=True)
+        popup.set_default_size(width, height)
+        popup.set_title(wv.get_title() or "Sign in")
+
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.append(Adw.HeaderBar())
+        box.append(wv)
+        popup.set_content(box)
+
+        # window.close() from the page tears the popup (and its WebView) down
+        # immediately instead of leaving an orphaned view behind.
+        wv.connect("close",         lambda _: popup.destroy())
+        wv.connect("notify::title", lambda w, _: popup.set_title(w.get_title() or "Sign in"))
+        wv.connect("create",        self._on_wv_create)
+        popup.connect("destroy",    lambda w: self._popups.pop(w, None))
+
+        self._popups[popup] = wv
+        popup.present()
 
       
     # Helpers
@@ -484,6 +1449,126 @@ class OfficeWindow(Adw.ApplicationWindow):
         page = self.tab_view.get_selected_page()
         return page.get_child() if page else None
 
+    def _entry_for_wv(self, wv):
+        for entry in self._all_tabs.values():
+            if entry.wv is wv:
+                return entry
+        return None
+
+    def _reload(self, wv, bypass_cache: bool = False):
+        """Reload wv, or leave it queued for reconnect while offline."""
+        if wv is None:
+            return
+        entry = self._entry_for_wv(wv)
+        if not self._online:
+            if entry is not None and entry.pending_uri is None:
+                entry.pending_uri = wv.get_uri()
+            return
+        if entry is not None and entry.pending_uri:
+            self._retry_load(entry)
+        elif bypass_cache:
+            wv.reload_bypass_cache()
+        else:
+            wv.reload()
+
+    def _retry_load(self, entry: TabEntry):
+        uri, entry.pending_uri = entry.pending_uri, None
+        if uri:
+            entry.wv.load_uri(uri)
+        else:
+            entry.wv.reload()
+
+      
+    # Power / idle handling
+      
+
+    def _update_power_mode(self):
+        low_power = self._power_saver or self._on_battery
+        if low_power == self._low_power:
+            return
+        self._low_power = low_power
+
+        # Background views switch now; the foreground one keeps what it has
+        # until another tab is selected, so the page in use isn't disturbed.
+        current = self._current_wv() if hasattr(self, "tab_view") else None
+        for entry in self._all_tabs.values():
+            if entry.wv is not current or not low_power:
+                entry.wv.set_settings(self._get_settings(entry.profile, low_power))
+
+        watchdog = getattr(self.get_application(), "watchdog", None)
+        if watchdog is not None:
+            watchdog.set_interval(LOW_POWER_HEARTBEAT_INTERVAL_MS if low_power
+                                  else HEARTBEAT_INTERVAL_MS)
+
+    def _hibernate_tab(self, entry: TabEntry):
+        uri = entry.wv.get_uri()
+        if not uri or uri == "about:blank":
+            return
+        entry.hibernated_uri = uri
+        entry.wv.load_uri("about:blank")
+
+    def _wake_tab(self, entry: TabEntry):
+        uri, entry.hibernated_uri = entry.hibernated_uri, None
+        if not uri:
+            return
+        if self._online:
+            entry.wv.load_uri(uri)
+        else:
+            entry.pending_uri = uri
+
+    def _on_idle_sweep(self):
+        if not self._low_power:
+            return GLib.SOURCE_CONTINUE
+        limit   = LOW_POWER_IDLE_UNLOAD_SECONDS
+        now     = time.monotonic()
+        current = self._current_wv()
+        for entry in self._all_tabs.values():
+            if (entry.wv is current
+                    or entry.hibernated_uri
+                    or entry.pending_uri
+                    or entry.track_label in HIBERNATE_EXEMPT
+                    or entry.wv.is_playing_audio()):
+                continue
+            if now - entry.last_active > limit:
+                self._hibernate_tab(entry)
+        return GLib.SOURCE_CONTINUE
+
+    def _on_power_changed(self, *_args):
+        self._power_saver = self._power_monitor.get_power_saver_enabled()
+        upower = getattr(self, "_upower", None)
+        if upower is not None:
+            on_battery = upower.get_cached_property("OnBattery")
+            self._on_battery = bool(on_battery.unpack()) if on_battery else False
+        self._update_power_mode()
+
+      
+    # Offline handling
+      
+
+    def _schedule_recovery(self):
+        """Reload failed/deferred tabs, selected one first, staggered."""
+        current = self._current_wv()
+        waiting = [e for e in self._all_tabs.values()
+                   if e.pending_uri and e not in self._recovery_sources]
+        waiting.sort(key=lambda e: e.wv is not current)
+        for i, entry in enumerate(waiting):
+            delay = RECONNECT_DELAY_MS + i * RECONNECT_STAGGER_MS
+            self._recovery_sources[entry] = GLib.timeout_add(
+                delay, self._on_recovery_timeout, entry)
+
+    def _cancel_recovery(self, entry: TabEntry = None):
+        entries = [entry] if entry is not None else list(self._recovery_sources)
+        for e in entries:
+            source_id = self._recovery_sources.pop(e, None)
+            if source_id is not None:
+                GLib.source_remove(source_id)
+
+    def _on_recovery_timeout(self, entry: TabEntry):
+        self._recovery_sources.pop(entry, None)
+        if self._online and entry.page in self._all_tabs and entry.pending_uri:
+            self._retry_load(entry)
+        return GLib.SOURCE_REMOVE
+
       
     # Signal handlers
       
@@ -504,7 +1589,74 @@ class OfficeWindow(Adw.ApplicationWindow):
             return
         self._highlight_active_app(wv.get_uri() or "")
 
+    def _on_wv_close(self, _wv, entry: TabEntry):
+        # try_close() in _on_close_page emits "close" too, after the page is gone
+        if entry.page in self._all_tabs:
+            self._close_tab_entry(entry)
+
+    def _on_tab_uri_changed(self, wv, _pspec, entry: TabEntry):
+        if entry.hibernated_uri:
+            return   # about:blank placeholder; keep indexing the real document
+        self._index_tab(entry, wv.get_uri() or "")
+
+    def _on_load_changed(self, _wv, event, entry: TabEntry):
+        if event == WebKit.LoadEvent.STARTED:
+            entry.pending_uri = None   # a fresh attempt; load-failed re-queues it
+
+    def _on_load_failed(self, _wv, _event, failing_uri, error, entry: TabEntry):
+        # Only transport failures are worth retrying; policy errors (downloads,
+        # unsupported MIME types) and plugin errors would just fail again.
+        if error.domain != GLib.quark_to_string(WebKit.network_error_quark()):
+            return False
+        if error.matches(WebKit.network_error_quark(), WebKit.NetworkError.CANCELLED):
+            return False
+        entry.pending_uri = failing_uri
+        # Offline: skip the error page, the tab is retried on reconnect
+        return not self._online
+
+    def _on_request_blocked(self, _ucm, _value, wv):
+        if not self._counting_blocked:
+            return   # the filter isn't attached yet, so the request went out
+        entry = self._entry_for_wv(wv)
+        if entry is None:
+            return
+        entry.blocked_requests += 1
+        tooltip = f"{entry.blocked_requests} tracking requests blocked"
+        entry.btn.set_tooltip_text(tooltip)
+        entry.page.set_tooltip(tooltip)
+        if entry is self._active_entry:
+            self._update_blocked_label()
+
+    def _update_blocked_label(self):
+        count = self._active_entry.blocked_requests if self._active_entry else 0
+        self.blocked_label.set_visible(count > 0)
+        self.blocked_label.set_label(f"{count} blocked")
+        self.blocked_label.set_tooltip_text(
+            f"{count} tracking requests blocked in this tab")
+
+    def _on_network_changed(self, _monitor, available):
+        self._online = bool(available)
+        if self._online:
+            self._schedule_recovery()
+        else:
+            self._cancel_recovery()
+
     def _on_selected_page_changed(self, tab_view, _pspec):
+        now = time.monotonic()
+        previous = self._active_entry
+        if previous is not None:
+            previous.last_active = now
+            # The tab that was in front when low-power mode started kept its
+            # settings; it gets the cheaper ones now that it's in the background
+            if self._low_power:
+                settings = self._get_settings(previous.profile, True)
+                if previous.wv.get_settings() is not settings:
+                    previous.wv.set_settings(settings)
+        self._active_entry = self._all_tabs.get(tab_view.get_selected_page())
+        if self._active_entry is not None:
+            self._active_entry.last_active = now
+            self._wake_tab(self._active_entry)
+
         wv = self._current_wv()
         if not wv:
             self.spinner.stop()
@@ -515,14 +1667,14 @@ class OfficeWindow(Adw.ApplicationWindow):
     def _on_close_page(self, tab_view, page):
         entry = self._all_tabs.pop(page, None)
         if entry:
+            if entry is self._active_entry:
+                self._active_entry = None
+            self._cancel_recovery(entry)
+            if self._url_index.get(entry.url_key) is entry:
+                del self._url_index[entry.url_key]
             self._remove_tab_button(entry)
             if entry.track_label:
                 self._named_tabs.pop(entry.track_label, None)
-            if entry.wv is self._root_wv:
-                self._root_wv = None
-                for e in self._all_tabs.values():
-                    self._root_wv = e.wv
-                    break
             try:
                 entry.wv.try_close()
             except Exception:
@@ -530,30 +1682,55 @@ class OfficeWindow(Adw.ApplicationWindow):
 
         tab_view.close_page_finish(page, True)
         if tab_view.get_n_pages() == 0:
-            self.get_application().quit()
+            self.close()   # quits, unless the Outlook companion takes over
         return True
 
-    def _on_wv_create(self, wv, _nav_action):
-        """target="_blank" links -> new untracked tab."""
-        new_wv = self._make_webview(related_wv=wv)
-        entry_ref = [None]
-        btn, lbl  = self._make_tab_button("New Tab", entry_ref)
-        page      = self.tab_view.append(new_wv)
-        page.set_title("New Tab")
-        entry     = TabEntry(page, new_wv, btn, lbl)
-        entry_ref[0] = entry
-
-        self._all_tabs[page] = entry
-        self._add_tab_button(entry)
-
-        new_wv.connect("notify::is-loading", self._on_loading_changed)
-        new_wv.connect("notify::title",      self._on_title_changed, entry)
-        new_wv.connect("notify::uri",        self._on_uri_changed)
-        new_wv.connect("create",             self._on_wv_create)
+    def _on_close_request(self, _win):
+        # The app (and the monitors) may outlive this window now
+        if self._closed:
+            return False
+        self._closed = True
+        for obj, handler_id in self._monitor_handlers:
+            obj.disconnect(handler_id)
+        self._monitor_handlers.clear()
+        GLib.source_remove(self._idle_sweep_source)
+        self._cancel_recovery()
+        self.get_application().on_window_closed(self)
+        return False
 
-        self.tab_view.set_selected_page(page)
+    def _on_wv_create(self, wv, nav_action):
+        """
+        New-window requests. The view is only placed once WebKit knows its
+        window features (ready-to-show): popups go to a throwaway window,
+        target="_blank" documents become new untracked tabs.
+        """
+        request = nav_action.get_request()
+        uri     = (request.get_uri() if request else None) or ""
+
+        # Document already open somewhere: bring that tab forward instead
+        existing = None if any(p in uri for p in POPUP_URL_PATTERNS) else self._find_open_tab(uri)
+        if existing is not None:
+            self._select_tab_entry(existing)
+            return None
+
+        # WebKit requires new windows to be related to their opener, so they
+        # always join the opener's process group.
+        opener  = self._entry_for_wv(wv)
+        profile = self._profile_for(uri=uri)
+        new_wv  = self._make_webview(related_wv=wv, profile=profile)
+        new_wv.connect("ready-to-show", self._on_wv_ready_to_show, uri, profile,
+                       opener.process_key if opener else "shared")
         return new_wv
 
+    def _on_wv_ready_to_show(self, new_wv, uri: str, profile: str, process_key: str):
+        if self._is_popup_request(uri, new_wv.get_window_properties()):
+            self._open_popup(new_wv)
+        else:
+            entry = self._add_tab(new_wv, "New Tab")
+            entry.profile     = profile
+            entry.process_key = process_key
+            self._index_tab(entry, new_wv.get_uri() or uri)
+
     def _on_create_window(self, _tab_view, *_):
         return None
 
@@ -575,12 +1752,12 @@ class OfficeWindow(Adw.ApplicationWindow):
                 if page: self.tab_view.close_page(page)
                 return True
             if keyval == Gdk.KEY_r and wv:
-                wv.reload(); return True
+                self._reload(wv); return True
             if keyval == Gdk.KEY_F5 and wv:
-                wv.reload_bypass_cache(); return True
+                self._reload(wv, bypass_cache=True); return True
 
         if keyval == Gdk.KEY_F5 and wv:
-            wv.reload(); return True
+            self._reload(wv); return True
 
         return False
 